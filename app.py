@@ -4,6 +4,7 @@ from gpt_module import call_openrouter, generate_ppt_outline
 from image_captioner import generate_image_caption
 from ppt_generator import create_ppt
 from chart_module import generate_chart_slide_from_csv
+from narration import narrate_slides, narration_zip
 
 import speech_recognition as sr
 from gtts import gTTS
@@ -20,10 +21,25 @@ if os.path.exists("firebase_key.json"):
     import firebase_admin
     from firebase_admin import credentials, auth, firestore
 
-    cred = credentials.Certificate("firebase_key.json")
-    firebase_admin.initialize_app(cred)
+    # Streamlit 每次交互都会重跑脚本，只在首次运行时初始化
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(credentials.Certificate("firebase_key.json"))
     db = firestore.client()
+    from collab_store import CollabStore, SaveConflict
+    store = st.session_state.setdefault("collab_store", CollabStore(db))
     firebase_enabled = True
+
+    def watch_current_deck(deck_id: str):
+        """
+        每个会话只保留一个监听：切换 PPT 时取消旧监听；
+        会话结束、session_state 被释放后 DeckWatch 被回收，监听随之取消
+        """
+        cw = st.session_state.pop("collab_watch", None)
+        if cw and cw.deck_id != deck_id:
+            cw.unsubscribe()
+            cw = None
+        st.session_state["collab_watch"] = cw or store.watch_deck(deck_id)
+        return st.session_state["collab_watch"]
 else:
     st.sidebar.warning("🔒 firebase_key.json 未找到，多人协作已禁用")
 
@@ -78,6 +94,9 @@ if mode == "🚀 PPT 生成":
     imgs     = st.file_uploader("🖼️ 上传图片 (可多选)", type=["jpg", "png", "jpeg"], accept_multiple_files=True)
     csv_file = st.file_uploader("📊 上传 CSV 数据 (可选)", type=["csv"])
 
+    narrate = st.checkbox("🎙️ 生成逐页讲解配音")
+    narrate_mode = st.radio("配音输出方式", ["嵌入 PPT", "单独下载 zip"], horizontal=True) if narrate else None
+
     if st.button("🔍 测试提纲"):
         text_content = ""
         if txt_file:
@@ -120,18 +139,23 @@ if mode == "🚀 PPT 生成":
                         f.write(csv_file.read())
                     slides.append(generate_chart_slide_from_csv(csv_path, language))
 
+                narrations = narrate_slides(slides, language) if narrate else None
+
                 out = create_ppt(
                     slides,
                     paths,
                     background=background,
                     title_font=title_font,
                     body_font=body_font,
-                    color_style=color_style
+                    color_style=color_style,
+                    narrations=narrations if narrate_mode == "嵌入 PPT" else None
                 )
             st.session_state["slides"] = slides
             st.success("✅ PPT 生成成功！")
             with open(out, "rb") as f:
                 st.download_button("⬇️ 点击下载 PPT", f, file_name="AutoPPT_AI.pptx")
+            if narrate_mode == "单独下载 zip":
+                st.download_button("⬇️ 下载逐页配音", narration_zip(narrations), file_name="AutoPPT_AI_narration.zip")
 
     # AI 通顺性检查
     if st.button("🧐 AI 检查PPT通顺性"):
@@ -175,17 +199,53 @@ elif mode == "👥 协作中心":
         if st.button(action):
             try:
                 if action == "注册":
-                    auth.create_user(email=email, password=pwd)
+                    user = auth.create_user(email=email, password=pwd)
+                    store.register_user(email, user.uid)
                     st.success("✅ 注册成功")
                 else:
-                    docs = db.collection("users").where("email", "==", email).stream()
-                    if any(True for _ in docs):
+                    if store.find_user(email):
+                        st.session_state["user"] = email.strip().lower()
                         st.success("✅ 登录成功")
                     else:
                         st.error("❌ 用户不存在，请先注册")
             except Exception as e:
                 st.error(f"Firebase 错误：{e}")
 
+        if "user" in st.session_state:
+            st.markdown(f"### 📁 协作 PPT（{st.session_state['user']}）")
+            deck_id = st.text_input("PPT 编号（留空则新建）", st.session_state.get("deck_id", ""))
+            col1, col2 = st.columns(2)
+            if col1.button("☁️ 保存当前 PPT"):
+                if "slides" not in st.session_state:
+                    st.warning("⚠️ 请先生成一份 PPT 再保存")
+                else:
+                    try:
+                        slides = st.session_state["slides"]
+                        deck_id = store.save_deck(deck_id or None, slides, st.session_state["user"],
+                                                  title=slides[0]["title"] if slides else "")
+                        st.session_state["deck_id"] = deck_id
+                        watch_current_deck(deck_id)
+                        # 保存时已在事务中合并协作者的改动，用合并结果替换本地副本
+                        st.session_state["slides"] = store.load_deck(deck_id)
+                        st.success(f"✅ 已保存，PPT 编号：{deck_id}")
+                    except SaveConflict as e:
+                        st.error(f"⚠️ 保存失败，{e}，请先重新加载协作 PPT 再修改")
+                    except Exception as e:
+                        st.error(f"Firebase 错误：{e}")
+            if col2.button("📥 加载协作 PPT") and deck_id:
+                try:
+                    # 监听器在后台按指纹同步协作者改动的页面，加载直接使用缓存，不再读取整份 PPT
+                    cw = watch_current_deck(deck_id)
+                    slides = store.load_deck(deck_id)
+                    changed = cw.take_changes()
+                    st.session_state["slides"] = slides
+                    st.session_state["deck_id"] = deck_id
+                    st.success(f"✅ 已加载 {len(slides)} 页")
+                    if changed:
+                        st.info(f"👥 协作者更新了 {len(changed)} 页")
+                except Exception as e:
+                    st.error(f"Firebase 错误：{e}")
+
 # —— 部署指南 ——  
 elif mode == "📦 部署指南":
     st.title("📦 在线部署指南")
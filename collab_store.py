@@ -0,0 +1,353 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+import weakref
+from urllib.parse import quote
+
+from google.cloud import firestore
+
+# 打开 PPT 时等待监听器首个快照填充缓存的最长时间（秒），超时则直接读取
+READY_TIMEOUT = 10.0
+
+
+def emulator_client(project_id: str = "autoppt-local"):
+    """
+    连接本地 Firestore 模拟器（需先设置 FIRESTORE_EMULATOR_HOST，例如 localhost:8080）
+    用于在不访问线上库的情况下测试协作存储
+    """
+    if not os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        raise RuntimeError("未设置 FIRESTORE_EMULATOR_HOST，无法连接 Firestore 模拟器")
+    return firestore.Client(project=project_id)
+
+
+def user_key(email: str) -> str:
+    """邮箱 -> users 集合中的文档 ID（大小写不敏感，转义 “/”）"""
+    return quote(email.strip().lower(), safe="@.+-_")
+
+
+def slide_fingerprint(slide: dict) -> str:
+    body = {k: v for k, v in slide.items() if k != "slide_id"}
+    raw = json.dumps(body, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def merge_order(primary: list[str], secondary: list[str]) -> list[str]:
+    """
+    以 primary 的顺序为准，把 secondary 中独有的页面插到它在 secondary 里的前一页之后
+    """
+    result = list(primary)
+    for i, sid in enumerate(secondary):
+        if sid in result:
+            continue
+        prev = secondary[i - 1] if i else None
+        pos = result.index(prev) + 1 if prev in result else (0 if prev is None else len(result))
+        result.insert(pos, sid)
+    return result
+
+
+def ensure_slide_ids(slides: list[dict]) -> list[str]:
+    """为没有 slide_id 的幻灯片分配稳定 ID，插入/删除页面时其余页面 ID 不变"""
+    ids = []
+    for s in slides:
+        if not s.get("slide_id"):
+            s["slide_id"] = uuid.uuid4().hex[:12]
+        ids.append(s["slide_id"])
+    return ids
+
+
+class SaveConflict(RuntimeError):
+    """本地修改/删除的页面在上次加载后已被协作者改动，需重新加载后再保存"""
+
+    def __init__(self, slide_ids: list[str]):
+        super().__init__(f"{len(slide_ids)} 页已被协作者修改：{', '.join(slide_ids)}")
+        self.slide_ids = slide_ids
+
+
+class DeckWatch:
+    """
+    watch_deck 的返回值
+    take_changes() 原子地取出并清空监听线程累积的变更页面 ID
+    unsubscribe() 取消监听；对象被回收（例如 Streamlit 会话结束、session_state 被释放）时也会自动取消
+    """
+
+    def __init__(self, store: "CollabStore", deck_id: str, on_change=None):
+        lock, changes = threading.Lock(), set()
+
+        def _record(delta):
+            with lock:
+                changes.update(delta)
+            if on_change:
+                on_change(delta)
+
+        self.deck_id = deck_id
+        self._lock, self._changes = lock, changes
+        watch = store._subscribe(deck_id, _record)
+        self._finalizer = weakref.finalize(self, store._unsubscribe, deck_id, watch)
+
+    def take_changes(self) -> set[str]:
+        with self._lock:
+            changes = set(self._changes)
+            self._changes.clear()
+        return changes
+
+    def unsubscribe(self) -> None:
+        self._finalizer()
+
+
+class CollabStore:
+    """
+    多人协作存储：
+    - users/{email}：按邮箱作为文档 ID，登录只读一个文档
+    - decks/{deck_id}：标题、所有者、页面顺序、各页指纹 fps 与版本号 rev
+    - decks/{deck_id}/slides/{slide_id}：每页一个文档，只写发生变化的页面
+    deck 文档里的指纹让同步只需读 1 个文档再拉取指纹变化的页面；本地缓存保存远端最新状态，
+    另记录用户本地副本的基线（上次加载/保存时的指纹），保存时在事务中与最新 deck 文档比较，
+    只写用户真正改动的页面，协作者的改动不会被覆盖
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._lock = threading.Lock()
+        self._decks: dict[str, dict] = {}       # deck_id -> deck 元数据
+        self._slides: dict[str, dict] = {}      # deck_id -> {slide_id: slide}
+        self._hashes: dict[str, dict] = {}      # deck_id -> {slide_id: fingerprint}
+        self._base: dict[str, dict] = {}        # deck_id -> 用户本地副本的 {slide_id: fingerprint}
+        self._base_order: dict[str, list] = {}  # deck_id -> 用户本地副本的页面顺序
+        self._ready: dict[str, threading.Event] = {}  # 有监听的 deck -> 首个快照是否已同步
+
+    # —— 用户 ——
+    def register_user(self, email: str, uid: str | None = None) -> None:
+        self.db.collection("users").document(user_key(email)).set({
+            "email": email.strip(),
+            "uid": uid,
+            "created_at": time.time(),
+        })
+
+    def find_user(self, email: str) -> dict | None:
+        snap = self.db.collection("users").document(user_key(email)).get()
+        return snap.to_dict() if snap.exists else None
+
+    # —— 幻灯片 ——
+    def _deck_ref(self, deck_id: str):
+        return self.db.collection("decks").document(deck_id)
+
+    def _apply_pending(self, deck_id: str, docs: dict, deleted: list, meta: dict):
+        """
+        提交前先把待写入的指纹和 deck 元数据记入缓存，监听器收到自己写入的回声时即可识别并忽略
+        返回回滚所需的旧值
+        """
+        cached = self._slides.setdefault(deck_id, {})
+        known = self._hashes.setdefault(deck_id, {})
+        undo = ({sid: (cached.get(sid), known.get(sid)) for sid in [*docs, *deleted]}, self._decks.get(deck_id))
+        for sid, (doc, fp) in docs.items():
+            cached[sid] = doc
+            known[sid] = fp
+        for sid in deleted:
+            cached.pop(sid, None)
+            known.pop(sid, None)
+        self._decks[deck_id] = meta
+        return undo
+
+    def _rollback(self, deck_id: str, undo) -> None:
+        slides, meta = undo
+        cached = self._slides.setdefault(deck_id, {})
+        known = self._hashes.setdefault(deck_id, {})
+        for sid, (doc, fp) in slides.items():
+            if fp is None:
+                cached.pop(sid, None)
+                known.pop(sid, None)
+            else:
+                cached[sid] = doc
+                known[sid] = fp
+        if meta is None:
+            self._decks.pop(deck_id, None)
+        else:
+            self._decks[deck_id] = meta
+
+    def _is_stale(self, deck_id: str, meta: dict) -> bool:
+        return meta.get("rev", 0) < (self._decks.get(deck_id) or {}).get("rev", 0)
+
+    def _sync(self, deck_id: str, meta: dict | None = None) -> dict:
+        """
+        按 deck 文档中的各页指纹同步缓存，只读取指纹与缓存不同的页面
+        meta 为空时先读取一次 deck 文档；返回 {slide_id: slide 或 None(已删除)}
+        """
+        if meta is None:
+            snap = self._deck_ref(deck_id).get()
+            meta = snap.to_dict() if snap.exists else {}
+        remote = meta.get("fps") or {}
+        with self._lock:
+            if self._is_stale(deck_id, meta):
+                return {}
+            known = self._hashes.get(deck_id, {})
+            stale = [sid for sid, fp in remote.items() if known.get(sid) != fp]
+
+        fetched = {}
+        if stale:
+            slides_ref = self._deck_ref(deck_id).collection("slides")
+            for snap in self.db.get_all([slides_ref.document(sid) for sid in stale]):
+                if snap.exists:
+                    data = snap.to_dict()
+                    data["slide_id"] = snap.id
+                    fetched[snap.id] = data
+
+        delta = {}
+        with self._lock:
+            if self._is_stale(deck_id, meta):
+                return {}
+            cached = self._slides.setdefault(deck_id, {})
+            known = self._hashes.setdefault(deck_id, {})
+            for sid, data in fetched.items():
+                fp = slide_fingerprint(data)
+                if known.get(sid) != fp:
+                    cached[sid] = data
+                    known[sid] = fp
+                    delta[sid] = dict(data)
+            for sid in [sid for sid in known if sid not in remote]:
+                cached.pop(sid, None)
+                known.pop(sid)
+                delta[sid] = None
+            self._decks[deck_id] = meta
+        return delta
+
+    def save_deck(self, deck_id: str | None, slides: list[dict], owner: str, title: str = "") -> str:
+        """
+        在事务中保存整份幻灯片，返回 deck_id
+        事务内读取最新的 deck 文档，与上次加载/保存时的基线比较：只写用户改动或新增的页面，
+        只删除用户本地曾有、现已移除的页面；协作者新增的页面和用户未改动的页面保持远端版本，页面顺序两边合并
+        用户改动/删除的页面若在此期间也被协作者改动，抛出 SaveConflict，不写入任何内容
+        冲突由事务在服务端保证，不依赖本地缓存是否最新；保存后调用 load_deck 可得到合并后的幻灯片
+        """
+        deck_id = deck_id or uuid.uuid4().hex
+        slide_ids = ensure_slide_ids(slides)
+        local_fps = {s["slide_id"]: slide_fingerprint(s) for s in slides}
+        deck_ref = self._deck_ref(deck_id)
+        slides_ref = deck_ref.collection("slides")
+        with self._lock:
+            base = dict(self._base.get(deck_id, {}))
+            base_order = list(self._base_order.get(deck_id, []))
+        undo = []
+
+        @firestore.transactional
+        def _save(transaction):
+            if undo:  # 事务因争用重试时，撤销上一轮预先记入缓存的内容
+                with self._lock:
+                    self._rollback(deck_id, undo.pop())
+            snap = deck_ref.get(transaction=transaction)
+            remote = snap.to_dict() if snap.exists else {}
+            remote_fps = remote.get("fps") or {}
+
+            conflicts, docs, deleted = [], {}, []
+            for s in slides:
+                sid, fp = s["slide_id"], local_fps[s["slide_id"]]
+                if fp == base.get(sid) or fp == remote_fps.get(sid):
+                    continue
+                if sid in base and remote_fps.get(sid) != base[sid]:
+                    conflicts.append(sid)
+                    continue
+                docs[sid] = (dict(s), fp)
+            for sid, fp in base.items():
+                if sid in local_fps or sid not in remote_fps:
+                    continue
+                if remote_fps[sid] != fp:
+                    conflicts.append(sid)
+                    continue
+                deleted.append(sid)
+            if conflicts:
+                raise SaveConflict(conflicts)
+
+            fps = {sid: fp for sid, fp in remote_fps.items() if sid not in deleted}
+            fps.update({sid: fp for sid, (_, fp) in docs.items()})
+            remote_order = [sid for sid in remote.get("slide_ids") or [] if sid in fps]
+            remote_order += [sid for sid in remote_fps if sid in fps and sid not in remote_order]
+            local_order = [sid for sid in slide_ids if sid in fps]
+            reordered = [sid for sid in slide_ids if sid in base] != [sid for sid in base_order if sid in local_fps]
+            order = merge_order(local_order, remote_order) if reordered else merge_order(remote_order, local_order)
+
+            meta = {"title": title or remote.get("title", ""), "owner": remote.get("owner") or owner,
+                    "slide_ids": order, "fps": fps}
+            if not docs and not deleted and all(remote.get(k) == v for k, v in meta.items()):
+                return remote
+            meta.update(rev=remote.get("rev", 0) + 1, updated_at=time.time(), updated_by=owner)
+            for sid, (doc, _) in docs.items():
+                transaction.set(slides_ref.document(sid), doc)
+            for sid in deleted:
+                transaction.delete(slides_ref.document(sid))
+            transaction.set(deck_ref, meta)
+            with self._lock:
+                undo.append(self._apply_pending(deck_id, docs, deleted, meta))
+            return meta
+
+        try:
+            meta = _save(self.db.transaction())
+        except Exception:
+            if undo:
+                with self._lock:
+                    self._rollback(deck_id, undo.pop())
+            raise
+
+        # 拉取协作者改动过、本地缓存尚未同步的页面
+        self._sync(deck_id, meta)
+        with self._lock:
+            fps = meta.get("fps") or {}
+            self._base[deck_id] = {sid: local_fps[sid] for sid in slide_ids if sid in fps}
+            self._base_order[deck_id] = [sid for sid in slide_ids if sid in fps]
+        return deck_id
+
+    def load_deck(self, deck_id: str) -> list[dict]:
+        """
+        读取幻灯片（按 slide_ids 排序）
+        有监听时直接使用监听器维护的缓存（首次等待首个快照），不再读取 Firestore；
+        否则读 1 个 deck 文档，只拉取指纹变化的页面
+        返回的内容即成为用户本地副本的基线，之后的 save_deck 与之比较
+        """
+        ready = self._ready.get(deck_id)
+        if ready is None or not ready.wait(READY_TIMEOUT):
+            self._sync(deck_id)
+        with self._lock:
+            slides = self._ordered(deck_id)
+            self._base[deck_id] = {s["slide_id"]: self._hashes[deck_id][s["slide_id"]] for s in slides}
+            self._base_order[deck_id] = [s["slide_id"] for s in slides]
+            return slides
+
+    def _ordered(self, deck_id: str) -> list[dict]:
+        slides = self._slides.get(deck_id, {})
+        order = list((self._decks.get(deck_id) or {}).get("slide_ids") or [])
+        order += [sid for sid in slides if sid not in order]
+        return [dict(slides[sid]) for sid in order if sid in slides]
+
+    # —— 监听 ——
+    def watch_deck(self, deck_id: str, on_change=None) -> DeckWatch:
+        """
+        订阅 decks/{deck_id}：deck 文档变化时按指纹只拉取变化的页面，缓存、页面顺序与标题随之更新
+        首个快照用于填充缓存，不作为变更上报；之后协作者改动的页面累积在 DeckWatch.take_changes()，
+        并以 on_change({slide_id: slide 或 None(已删除)}) 回调（在 Firestore 的监听线程中执行）
+        自己的写入在提交前已记入缓存，其回声会被过滤
+        不再需要时调用 .unsubscribe()，否则监听线程会一直运行
+        """
+        return DeckWatch(self, deck_id, on_change)
+
+    def _subscribe(self, deck_id: str, on_change):
+        ready = threading.Event()
+        with self._lock:
+            self._ready[deck_id] = ready
+
+        def _on_snapshot(docs, _changes, _read_time):
+            first = not ready.is_set()
+            try:
+                meta = docs[0].to_dict() if docs and docs[0].exists else {}
+                delta = self._sync(deck_id, meta)
+            finally:
+                ready.set()
+            if delta and not first:
+                on_change(delta)
+
+        return self._deck_ref(deck_id).on_snapshot(_on_snapshot)
+
+    def _unsubscribe(self, deck_id: str, watch) -> None:
+        watch.unsubscribe()
+        with self._lock:
+            self._ready.pop(deck_id, None)
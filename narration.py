@@ -0,0 +1,142 @@
+import hashlib
+import io
+import os
+import re
+import time
+import wave
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+AUDIO_DIR = "temp_audio"
+# 合成失败时的重试次数与退避基数（秒），第 n 次重试前等待 RETRY_BACKOFF * 2^(n-1)
+MAX_RETRIES = 3
+RETRY_BACKOFF = 1.0
+
+
+class GTTSBackend:
+    """
+    在线 gTTS 合成，voice 对应 gTTS 的 tld（口音），例如 com / co.uk / com.au
+    gTTS 走的是会限流的非官方接口，并发限制在 max_workers 以内
+    """
+    name = "gtts"
+    fmt = "mp3"
+    max_workers = 8
+
+    def synthesize(self, text: str, voice: str = "", language: str = "zh") -> bytes:
+        from gtts import gTTS
+        lang = "zh-CN" if language == "zh" else language
+        tts = gTTS(text, lang=lang, tld=voice or "com")
+        buf = io.BytesIO()
+        tts.write_to_fp(buf)
+        return buf.getvalue()
+
+
+class SilentBackend:
+    """
+    离线占位：按文字长度生成静音 WAV，用于无网络环境或测试
+    任何带 name / fmt / synthesize(text, voice, language) 的对象都可以作为后端，
+    可选的 max_workers 属性限制并发数，缺省时每页一个线程
+    """
+    name = "silent"
+    fmt = "wav"
+
+    def __init__(self, seconds_per_char: float = 0.05, rate: int = 8000):
+        self.seconds_per_char = seconds_per_char
+        self.rate = rate
+
+    def synthesize(self, text: str, voice: str = "", language: str = "zh") -> bytes:
+        frames = int(max(len(text) * self.seconds_per_char, 0.5) * self.rate)
+        buf = io.BytesIO()
+        with wave.open(buf, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(self.rate)
+            w.writeframes(b"\x00\x00" * frames)
+        return buf.getvalue()
+
+
+def speaker_text(slide: dict) -> str:
+    """
+    幻灯片讲稿：标题 + 正文 + 拓展说明，去掉“📌”“🎬 推荐动画”等排版标记
+    """
+    parts = [slide.get("title", ""), slide.get("content", ""), slide.get("extended", "")]
+    text = "\n".join(p.strip() for p in parts if p and p.strip())
+    text = re.sub(r"^🎬.*$", "", text, flags=re.M)
+    text = text.replace("📌", "")
+    return re.sub(r"\n{2,}", "\n", text).strip()
+
+
+def audio_cache_path(text: str, voice: str, language: str, backend) -> str:
+    key = hashlib.sha256(f"{backend.name}\0{voice}\0{language}\0{text}".encode("utf-8")).hexdigest()
+    return os.path.join(AUDIO_DIR, f"{key}.{backend.fmt}")
+
+
+def synthesize_cached(text: str, voice: str, language: str, backend, max_retries: int = MAX_RETRIES) -> str:
+    """
+    合成单段语音并返回音频文件路径，相同 (文字, 音色, 语言) 直接复用缓存
+    合成失败（如网络错误、429 限流）时按指数退避重试，仍失败则抛出最后一次的异常
+    """
+    path = audio_cache_path(text, voice, language, backend)
+    if os.path.exists(path):
+        return path
+    for attempt in range(1, max_retries + 1):
+        try:
+            data = backend.synthesize(text, voice, language)
+            break
+        except Exception:
+            if attempt < max_retries:
+                time.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+                continue
+            raise
+    tmp = f"{path}.{os.getpid()}.{id(data)}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return path
+
+
+def narrate_slides(
+    slides: list[dict],
+    language: str = "zh",
+    voice: str = "",
+    backend=None,
+    max_workers: int | None = None
+) -> list[str | None]:
+    """
+    为每页幻灯片并行合成讲解音频，返回与 slides 一一对应的音频路径（无讲稿或合成失败的页面为 None）
+    线程数取 max_workers，未指定时取后端的 max_workers（如 GTTSBackend 为 8），后端也未限制时每页一个线程；
+    并发足够时总耗时约等于最慢的一段
+    单页重试后仍失败只跳过该页，不影响其他页面和 PPT 生成
+    """
+    backend = backend or GTTSBackend()
+    os.makedirs(AUDIO_DIR, exist_ok=True)
+    texts = [speaker_text(s) for s in slides]
+
+    results: list[str | None] = [None] * len(slides)
+    todo = [i for i, t in enumerate(texts) if t]
+    if not todo:
+        return results
+    limit = max_workers or getattr(backend, "max_workers", None) or len(todo)
+    failed = []
+    with ThreadPoolExecutor(max_workers=min(limit, len(todo))) as pool:
+        futures = {i: pool.submit(synthesize_cached, texts[i], voice, language, backend) for i in todo}
+        for i, fut in futures.items():
+            try:
+                results[i] = fut.result()
+            except Exception as e:
+                failed.append(f"第 {i + 1} 页（{e}）")
+    if failed:
+        st.warning(f"⚠️ 以下页面配音失败，已跳过：{'；'.join(failed)}")
+    return results
+
+
+def narration_zip(narrations: list[str | None]) -> bytes:
+    """把逐页音频打包成 zip：slide_01.mp3, slide_02.mp3 ..."""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as zf:
+        for i, path in enumerate(narrations, 1):
+            if path:
+                zf.write(path, f"slide_{i:02d}{os.path.splitext(path)[1]}")
+    return buf.getvalue()
@@ -2,6 +2,9 @@ from pptx import Presentation
 from pptx.util import Inches, Pt
 from pptx.dml.color import RGBColor
 from pptx.enum.text import PP_ALIGN
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.oxml.ns import qn
+import os
 import re
 
 def fit_font_size(text: str, base_size: int = 20) -> Pt:
@@ -56,13 +59,36 @@ def set_font(text_frame, font_name: str, font_size: Pt = Pt(24), bold: bool = Fa
             run.font.bold = bold
             run.font.color.rgb = font_color
 
+def add_narration(sl, audio_path: str, w, h):
+    """
+    在幻灯片右下角嵌入讲解音频
+    python-pptx 只提供 add_movie，这里把生成的视频元素改成音频：
+    a:videoFile -> a:audioFile（关系类型改为 audio），计时中的 p:video -> p:audio 并标记为旁白
+    """
+    ext = os.path.splitext(audio_path)[1].lstrip(".").lower()
+    mime = {"mp3": "audio/mpeg", "wav": "audio/wav"}.get(ext, "audio/mpeg")
+    size = Inches(0.6)
+    media = sl.shapes.add_movie(audio_path, w - size - Inches(0.2), h - size - Inches(0.2), size, size, mime_type=mime)
+
+    video_file = media.element.xpath("./p:nvPicPr/p:nvPr/a:videoFile")[0]
+    video_rId = video_file.get(qn("r:link"))
+    audio_rId = sl.part.relate_to(sl.part.related_part(video_rId), RT.AUDIO)
+    video_file.addprevious(video_file.makeelement(qn("a:audioFile"), {qn("r:link"): audio_rId}))
+    video_file.getparent().remove(video_file)
+    sl.part.drop_rel(video_rId)
+
+    for node in sl.element.xpath(f".//p:timing//p:video[.//p:spTgt/@spid='{media.shape_id}']"):
+        node.tag = qn("p:audio")
+        node.set("isNarration", "1")
+
 def create_ppt(
     slides: list[dict],
     image_paths: list[str],
     background: str | None = None,
     title_font: str = "微软雅黑",
     body_font: str = "微软雅黑",
-    color_style: str = "默认"
+    color_style: str = "默认",
+    narrations: list[str | None] | None = None
 ) -> str:
     prs = Presentation()
     w, h = prs.slide_width, prs.slide_height
@@ -77,7 +103,8 @@ def create_ppt(
     }
     font_color = color_map.get(color_style, RGBColor(0,0,0))
 
-    for slide in slides:
+    for idx, slide in enumerate(slides):
+        audio = narrations[idx] if narrations and idx < len(narrations) else None
         is_image_slide = "image_path" in slide
 
         if is_image_slide:
@@ -107,6 +134,8 @@ def create_ppt(
 
             notes = sl.notes_slide.notes_text_frame
             notes.text = f"推荐动画：{ani}" if ani else ""
+            if audio:
+                add_narration(sl, audio, w, h)
 
             extended = slide.get("extended", "").strip()
             if extended:
@@ -150,6 +179,8 @@ def create_ppt(
                 ph = sl.placeholders[1]
                 ph.text = auto_linebreak(txt, 60)
                 set_font(ph.text_frame, body_font, fit_font_size(txt), font_color=font_color)
+                if audio and i == 0:
+                    add_narration(sl, audio, w, h)
 
     out = "AutoPPT_AI.pptx"
     prs.save(out)
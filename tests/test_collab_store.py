@@ -0,0 +1,135 @@
+"""
+协作存储的模拟器测试，先启动 Firestore 模拟器：
+
+    firebase emulators:start --only firestore
+    export FIRESTORE_EMULATOR_HOST=localhost:8080
+"""
+import os
+import time
+
+import pytest
+
+pytestmark = pytest.mark.skipif(
+    not os.environ.get("FIRESTORE_EMULATOR_HOST"), reason="需要 Firestore 模拟器（FIRESTORE_EMULATOR_HOST）"
+)
+
+collab_store = pytest.importorskip("collab_store")
+from collab_store import CollabStore, SaveConflict, emulator_client
+
+
+@pytest.fixture
+def db():
+    return emulator_client()
+
+
+def make_deck(store, n=3):
+    return store.save_deck(None, [{"title": "t", "content": str(i)} for i in range(n)], "a@x.com", "T")
+
+
+def contents(slides):
+    return [s["content"] for s in slides]
+
+
+def wait_for(cond, timeout=10.0):
+    end = time.time() + timeout
+    while time.time() < end:
+        if cond():
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def test_concurrent_edit_raises_conflict(db):
+    a, b = CollabStore(db), CollabStore(db)
+    deck_id = make_deck(a)
+    local_a = a.load_deck(deck_id)
+    local_b = b.load_deck(deck_id)
+
+    local_b[0]["content"] = "B edit"
+    b.save_deck(deck_id, local_b, "b@x.com")
+
+    # A 没有监听、缓存已过期，冲突仍由事务检出
+    local_a[0]["content"] = "A edit"
+    with pytest.raises(SaveConflict) as exc:
+        a.save_deck(deck_id, local_a, "a@x.com")
+    assert exc.value.slide_ids == [local_a[0]["slide_id"]]
+    assert contents(CollabStore(db).load_deck(deck_id)) == ["B edit", "1", "2"]
+    assert contents(a.load_deck(deck_id)) == ["B edit", "1", "2"]
+
+
+def test_stale_save_keeps_collaborator_insert(db):
+    a, b = CollabStore(db), CollabStore(db)
+    deck_id = make_deck(a)
+    local_a = a.load_deck(deck_id)
+
+    local_b = b.load_deck(deck_id)
+    local_b.insert(1, {"title": "t", "content": "B new"})
+    b.save_deck(deck_id, local_b, "b@x.com")
+
+    local_a[2]["content"] = "A edit"
+    a.save_deck(deck_id, local_a, "a@x.com")
+
+    expected = ["0", "B new", "1", "A edit"]
+    assert contents(CollabStore(db).load_deck(deck_id)) == expected
+    assert contents(a.load_deck(deck_id)) == expected
+    assert len(db.collection("decks").document(deck_id).get().to_dict()["slide_ids"]) == 4
+
+
+def test_delete_slide(db):
+    a, b = CollabStore(db), CollabStore(db)
+    deck_id = make_deck(a)
+    local_a = a.load_deck(deck_id)
+
+    local_b = b.load_deck(deck_id)
+    local_b.append({"title": "t", "content": "B new"})
+    b.save_deck(deck_id, local_b, "b@x.com")
+
+    removed = local_a.pop(1)
+    a.save_deck(deck_id, local_a, "a@x.com")
+
+    # 只删除 A 本地曾有的页面，B 新增的页面保留
+    assert contents(CollabStore(db).load_deck(deck_id)) == ["0", "2", "B new"]
+    slide_doc = db.collection("decks").document(deck_id).collection("slides").document(removed["slide_id"])
+    assert not slide_doc.get().exists
+
+
+def test_failed_commit_rolls_back_cache(db, monkeypatch):
+    a = CollabStore(db)
+    deck_id = make_deck(a)
+    local_a = a.load_deck(deck_id)
+    local_a[1]["content"] = "lost"
+
+    def _fail(self, *args, **kwargs):
+        raise RuntimeError("commit failed")
+
+    monkeypatch.setattr(collab_store.firestore.Transaction, "_commit", _fail)
+    with pytest.raises(RuntimeError):
+        a.save_deck(deck_id, local_a, "a@x.com")
+    monkeypatch.undo()
+
+    local_a = a.load_deck(deck_id)
+    assert contents(local_a) == ["0", "1", "2"]
+    local_a[1]["content"] = "retry"
+    a.save_deck(deck_id, local_a, "a@x.com")
+    assert contents(CollabStore(db).load_deck(deck_id)) == ["0", "retry", "2"]
+
+
+def test_watch_reports_only_collaborator_changes(db):
+    a, b = CollabStore(db), CollabStore(db)
+    deck_id = make_deck(a)
+    watch = a.watch_deck(deck_id)
+    try:
+        local_a = a.load_deck(deck_id)
+        local_a[0]["content"] = "A edit"
+        a.save_deck(deck_id, local_a, "a@x.com")
+
+        local_b = b.load_deck(deck_id)
+        local_b[2]["content"] = "B edit"
+        b.save_deck(deck_id, local_b, "b@x.com")
+
+        changed = set()
+        assert wait_for(lambda: changed.update(watch.take_changes()) or local_b[2]["slide_id"] in changed)
+        assert changed == {local_b[2]["slide_id"]}
+        assert contents(a.load_deck(deck_id)) == ["A edit", "1", "B edit"]
+    finally:
+        watch.unsubscribe()
@@ -0,0 +1,115 @@
+import threading
+import time
+import zipfile
+
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("pptx")
+from pptx import Presentation
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+
+import narration
+from narration import SilentBackend, narrate_slides, narration_zip
+from ppt_generator import create_ppt
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    # 音频缓存和生成的 PPT 都写在当前目录下
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(narration, "RETRY_BACKOFF", 0)
+    monkeypatch.setattr(narration.st, "warning", lambda msg: None)
+
+
+class FlakyBackend(SilentBackend):
+    """含 “boom” 的文字总是失败，含 “once” 的文字第一次失败"""
+    name = "flaky"
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def synthesize(self, text, voice="", language="zh"):
+        self.calls.append(text)
+        if "boom" in text or ("once" in text and self.calls.count(text) == 1):
+            raise IOError("429 Too Many Requests")
+        return super().synthesize(text, voice, language)
+
+
+class ConcurrencyBackend(SilentBackend):
+    name = "concurrency"
+
+    def __init__(self, max_workers=None):
+        super().__init__()
+        self.name = f"concurrency-{max_workers}"  # 区分缓存，避免两次调用互相命中
+        if max_workers:
+            self.max_workers = max_workers
+        self.active = self.peak = 0
+        self.lock = threading.Lock()
+
+    def synthesize(self, text, voice="", language="zh"):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.1)
+        with self.lock:
+            self.active -= 1
+        return super().synthesize(text, voice, language)
+
+
+def make_slides(n):
+    return [{"title": f"第 {i + 1} 页", "content": f"内容 {i + 1}", "animation": None} for i in range(n)]
+
+
+def test_embeds_audio_per_slide():
+    # 讲稿长度不同，静音片段内容不同，不会被 python-pptx 按内容去重
+    slides = [{"title": f"第 {i + 1} 页", "content": "内容" * 10 * (i + 1), "animation": None} for i in range(3)]
+    clips = narrate_slides(slides, backend=SilentBackend())
+    out = create_ppt(slides, [], narrations=clips)
+
+    with zipfile.ZipFile(out) as zf:
+        media = [n for n in zf.namelist() if n.startswith("ppt/media/") and n.endswith(".wav")]
+    assert len(media) == 3
+
+    prs = Presentation(out)
+    for sl in prs.slides:
+        assert len(sl.element.xpath(".//a:audioFile")) == 1
+        assert not sl.element.xpath(".//a:videoFile")
+        assert len(sl.element.xpath(".//p:timing//p:audio")) == 1
+        assert RT.AUDIO in {rel.reltype for rel in sl.part.rels.values()}
+
+
+def test_narration_zip_names():
+    clips = narrate_slides([{"title": "a"}, {"title": ""}, {"title": "c"}], backend=SilentBackend())
+    assert clips[1] is None
+    with zipfile.ZipFile(narration.io.BytesIO(narration_zip(clips))) as zf:
+        assert zf.namelist() == ["slide_01.wav", "slide_03.wav"]
+
+
+def test_failed_clip_returns_none_and_retries():
+    backend = FlakyBackend()
+    clips = narrate_slides([{"title": "ok"}, {"title": "boom"}, {"title": "once"}], backend=backend)
+    assert clips[0] and clips[2]
+    assert clips[1] is None
+    assert backend.calls.count("boom") == narration.MAX_RETRIES
+    assert backend.calls.count("once") == 2
+
+
+def test_cached_clips_skip_backend():
+    backend = FlakyBackend()
+    slides = make_slides(2)
+    first = narrate_slides(slides, backend=backend)
+    backend.calls.clear()
+    assert narrate_slides(slides, backend=backend) == first
+    assert backend.calls == []
+
+
+def test_pool_size_follows_backend_limit():
+    local = ConcurrencyBackend()
+    narrate_slides(make_slides(12), backend=local)
+    assert local.peak == 12
+
+    limited = ConcurrencyBackend(max_workers=3)
+    narrate_slides(make_slides(12), backend=limited)
+    assert limited.peak == 3